@@ -0,0 +1,36 @@
+"""
+gunicorn settings: `gunicorn` (run from the project root) picks this up.
+
+The app is imported once in the master (preload_app) and forked, so each
+worker starts with Django and the project modules already loaded; the
+post_fork hook then warms templates, the DB connection and catalogue
+caches before the worker accepts its first request.
+
+Set DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS, and run
+`python manage.py collectstatic` before starting (WhiteNoise serves the
+manifest-hashed files from STATIC_ROOT).
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings.prod")
+
+wsgi_app = "myproject.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers: THROTTLE_SHED counts busy threads per worker, so it
+# needs more than one (keep `threads` above its limits).
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Never share the master's DB connection with a forked worker.
+    from django.db import connections
+    connections.close_all()
+
+    from myapp.warmup import warm_up
+    timings = warm_up()
+    summary = ", ".join(f"{name} {secs * 1000:.1f}ms" for name, secs in timings.items())
+    server.log.info("Worker %s warmed up: %s", worker.pid, summary)
@@ -2,7 +2,11 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Order, OrderItem
+import re
+
+from .models import Order, OrderItem, AbandonedCart
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -13,6 +17,28 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ("status", "created_at")
     search_fields = ("customer_name", "email")
     inlines = [OrderItemInline]
+    # Skip the unfiltered COUNT(*) over the whole table on every search
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # A full email address is first tried as an exact match on the
+        # (email, created_at, id) index; partial terms ("john@",
+        # "@gmail.com") or addresses stored in another case fall back to
+        # the usual icontains search.
+        term = search_term.strip()
+        if EMAIL_RE.fullmatch(term):
+            exact = queryset.filter(email__in={term, term.lower()})
+            if exact.exists():
+                return exact, False
+        return super().get_search_results(request, queryset, search_term)
 
 admin.site.register(Order, OrderAdmin)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+
+
+class AbandonedCartAdmin(admin.ModelAdmin):
+    list_display = ("day", "product", "carts", "quantity", "value")
+    list_filter = ("day",)
+    list_select_related = ("product",)
+
+admin.site.register(AbandonedCart, AbandonedCartAdmin)
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Session and abandoned-cart garbage collection.
+
+Django never deletes expired rows from django_session on its own, and every
+anonymous visitor gets one (the cart lives there). `purge_expired_sessions`
+removes them in small batches, each in its own short transaction, after
+folding any cart they held into AbandonedCart daily totals. Carts don't
+reserve stock in this shop, so there are no holds to release.
+
+`incremental_vacuum` then hands the freed SQLite pages back to the OS
+without the full-file lock of a plain VACUUM.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AbandonedCart, Products
+
+
+def _cart_totals(rows):
+    """{(day, product_id): [carts, quantity, value]} for a batch of sessions."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    totals = defaultdict(lambda: [0, 0, Decimal("0")])
+    # Each save sets expiry to SESSION_COOKIE_AGE from then, so this is the
+    # day the session (its cart) last changed: when the cart was left.
+    idle = timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    for _, session_data, expire_date in rows:
+        # decode() returns {} for data it can't read
+        cart = store.decode(session_data).get("cart") or {}
+        day = (expire_date - idle).date()
+        for pid, item in cart.items():
+            try:
+                pid, qty = int(pid), int(item.get("quantity", 0))
+                price = Decimal(str(item.get("price", "0")))
+            except (AttributeError, TypeError, ValueError, InvalidOperation):
+                continue
+            if qty <= 0:
+                continue
+            entry = totals[(day, pid)]
+            entry[0] += 1
+            entry[1] += qty
+            entry[2] += price * qty
+
+    existing = set(Products.objects.filter(
+        id__in={pid for _, pid in totals}
+    ).values_list("id", flat=True))
+    return {key: value for key, value in totals.items() if key[1] in existing}
+
+
+def _record_abandoned(totals):
+    for (day, pid), (carts, qty, value) in totals.items():
+        updated = AbandonedCart.objects.filter(day=day, product_id=pid).update(
+            carts=F("carts") + carts,
+            quantity=F("quantity") + qty,
+            value=F("value") + value,
+        )
+        if not updated:
+            AbandonedCart.objects.create(
+                day=day, product_id=pid, carts=carts, quantity=qty, value=value
+            )
+
+
+def purge_expired_sessions(batch_size=500, max_batches=None, pause=0.05, now=None):
+    """
+    Delete expired sessions `batch_size` at a time, sleeping `pause`
+    seconds between batches so checkout writes can get in.
+
+    Sessions are read and decoded outside any transaction; only the
+    AbandonedCart upserts and the DELETE hold the write lock. Returns a
+    dict of counts and lock timings (seconds).
+    """
+    now = now or timezone.now()
+    stats = {
+        "sessions": 0, "carts": 0, "batches": 0,
+        "lock_seconds": 0.0, "max_lock_seconds": 0.0,
+    }
+    while max_batches is None or stats["batches"] < max_batches:
+        rows = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by("expire_date")
+            .values_list("session_key", "session_data", "expire_date")[:batch_size]
+        )
+        if not rows:
+            break
+
+        totals = _cart_totals(rows)
+        start = time.perf_counter()
+        with transaction.atomic():
+            _record_abandoned(totals)
+            deleted, _ = Session.objects.filter(
+                session_key__in=[row[0] for row in rows], expire_date__lt=now
+            ).delete()
+        held = time.perf_counter() - start
+
+        stats["sessions"] += deleted
+        stats["carts"] += sum(entry[0] for entry in totals.values())
+        stats["batches"] += 1
+        stats["lock_seconds"] += held
+        stats["max_lock_seconds"] = max(stats["max_lock_seconds"], held)
+
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+    return stats
+
+
+def incremental_vacuum(pages=None):
+    """
+    Release up to `pages` free SQLite pages (all if None). Returns the
+    number released, or None if the database isn't SQLite in
+    auto_vacuum=INCREMENTAL mode (see enable_incremental_vacuum).
+    """
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:  # 2 == INCREMENTAL
+            return None
+        cursor.execute("PRAGMA freelist_count")
+        before = cursor.fetchone()[0]
+        # The pragma frees one page per step and the sqlite3 module only
+        # steps execute() once; executescript() runs it to completion.
+        limit = f"({int(pages)})" if pages else ""
+        connection.connection.executescript(f"PRAGMA incremental_vacuum{limit};")
+        cursor.execute("PRAGMA freelist_count")
+        return before - cursor.fetchone()[0]
+
+
+def enable_incremental_vacuum():
+    """
+    One-off switch to auto_vacuum=INCREMENTAL. SQLite only applies it on a
+    full VACUUM, which rewrites the file under an exclusive lock, so run
+    this during a quiet period.
+    """
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+    return True
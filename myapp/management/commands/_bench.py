@@ -0,0 +1,40 @@
+"""Shared helpers for the bench_* management commands."""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+
+
+@contextmanager
+def scratch_database():
+    """
+    Point the default connection at a throwaway, migrated SQLite file so
+    benchmarks never write to db.sqlite3. The file is removed afterwards.
+    """
+    settings_dict = connections["default"].settings_dict
+    original = settings_dict["NAME"]
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+
+    connections.close_all()
+    settings_dict["NAME"] = path
+    try:
+        call_command("migrate", verbosity=0)
+        yield path
+    finally:
+        connections.close_all()
+        settings_dict["NAME"] = original
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from myapp.models import Products
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rebuilding a cart/grid widget from HTML pages (one "
+        "product_detail per item, or scraping /product_list/) with one "
+        "batch call to /api/products/. Read-only; uses the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=200)
+        parser.add_argument("--items", type=int, default=20, help="Products per widget.")
+
+    def handle(self, *args, **options):
+        # Measure the endpoints, not ThrottleMiddleware's 429s
+        middleware = [
+            m for m in settings.MIDDLEWARE if m != "myapp.middleware.ThrottleMiddleware"
+        ]
+        with override_settings(MIDDLEWARE=middleware):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        rounds = options["rounds"]
+        ids = list(Products.objects.order_by("id").values_list("id", flat=True)[:options["items"]])
+        if not ids:
+            self.stderr.write("No products to fetch.")
+            return
+
+        client = Client()
+        id_list = ",".join(map(str, ids))
+        scenarios = [
+            ("HTML per product", [f"/product/{pk}/" for pk in ids]),
+            ("HTML /product_list/", ["/product_list/"]),
+            ("API batch", [f"/api/products/?ids={id_list}"]),
+            ("API batch, 2 fields", [f"/api/products/?ids={id_list}&fields=id,price"]),
+        ]
+
+        self.stdout.write(f"{len(ids)} products per widget, {rounds} rounds")
+        for label, urls in scenarios:
+            size = sum(len(client.get(url).content) for url in urls)  # warm-up
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for url in urls:
+                    client.get(url)
+            per_widget = (time.perf_counter() - start) / rounds * 1000
+            self.stdout.write(
+                f"{label:>22}: {per_widget:8.3f} ms/widget  {len(urls):3d} requests  {size:7d} bytes"
+            )
+
+        url = scenarios[2][1][0]
+        etag = client.get(url)["ETag"]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            client.get(url, HTTP_IF_NONE_MATCH=etag)
+        per_widget = (time.perf_counter() - start) / rounds * 1000
+        self.stdout.write(f"{'API batch, 304':>22}: {per_widget:8.3f} ms/widget")
@@ -0,0 +1,56 @@
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from myapp import prerender
+from myapp.models import Products
+
+
+class Command(BaseCommand):
+    help = (
+        "Product page throughput rendered by Django vs served pre-rendered "
+        "(through PrerenderedPagesMiddleware, and as a bare file read, the "
+        "ceiling a front-end server approaches). Pages go to a temp dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+
+    def _rate(self, fetch, urls, n):
+        for url in urls:
+            fetch(url)  # warm-up
+        start = time.perf_counter()
+        for i in range(n):
+            fetch(urls[i % len(urls)])
+        return n / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+        pks = list(Products.objects.values_list("pk", flat=True))
+        if not pks:
+            self.stderr.write("No products to render.")
+            return
+        urls = [f"/product/{pk}/" for pk in pks]
+
+        with tempfile.TemporaryDirectory() as root:
+            dynamic = self._rate(Client().get, urls, n)
+
+            with override_settings(STATIC_PAGES_ENABLED=True, STATIC_PAGES_ROOT=root):
+                prerender.render_all()
+                served = self._rate(Client().get, urls, n)
+
+                def read_file(url):
+                    with open(prerender.page_path(url), "rb") as f:
+                        return f.read()
+                raw = self._rate(read_file, urls, n)
+
+        self.stdout.write(f"{len(urls)} product pages, {n} requests")
+        for label, rate in (
+            ("Django render", dynamic),
+            ("pre-rendered (middleware)", served),
+            ("pre-rendered (file read)", raw),
+        ):
+            self.stdout.write(f"{label:>26}: {rate:9.0f} req/s  ({rate / dynamic:5.1f}x)")
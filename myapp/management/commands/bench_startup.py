@@ -0,0 +1,68 @@
+import json
+import os
+import secrets
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so nothing is imported or compiled yet.
+PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = sys.argv[1]
+from myproject.wsgi import application
+from django.test import Client
+t_boot = time.perf_counter() - t0
+
+t_warm = 0.0
+if sys.argv[2] == "1":
+    from myapp.warmup import warm_up
+    t_warm = sum(warm_up().values())
+
+client = Client()
+urls = ["/", "/product_list/", "/search_suggest/?q=a"]
+first, second = [], []
+for url in urls:
+    start = time.perf_counter(); client.get(url); first.append(time.perf_counter() - start)
+for url in urls:
+    start = time.perf_counter(); client.get(url); second.append(time.perf_counter() - start)
+print(json.dumps({"boot": t_boot, "warm": t_warm, "first": first, "second": second}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure time-to-first-request of a fresh worker process, cold and "
+        "after myapp.warmup.warm_up(), for a settings profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--settings-module", default="myproject.settings.prod")
+        parser.add_argument("--runs", type=int, default=5)
+
+    def _probe(self, module, warm):
+        env = dict(os.environ, DJANGO_SERVE_MEDIA="0")
+        # The prod profile refuses to start without these; a throwaway key
+        # is fine for a process that only serves the test client.
+        env.setdefault("DJANGO_SECRET_KEY", secrets.token_urlsafe(50))
+        env.setdefault("DJANGO_ALLOWED_HOSTS", "testserver")
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE, module, "1" if warm else "0"],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        module, runs = options["settings_module"], options["runs"]
+        self.stdout.write(f"{module}, best of {runs} fresh processes (ms)")
+        for warm in (False, True):
+            samples = [self._probe(module, warm) for _ in range(runs)]
+            best = min(samples, key=lambda s: sum(s["first"]))
+            label = "warmed" if warm else "cold"
+            self.stdout.write(
+                f"{label:>7}: boot {best['boot'] * 1000:7.1f}  warm-up {best['warm'] * 1000:7.1f}  "
+                f"first requests {sum(best['first']) * 1000:7.1f}  "
+                f"steady {sum(best['second']) * 1000:7.1f}"
+            )
@@ -0,0 +1,78 @@
+import multiprocessing
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from myapp.models import Products
+
+from ._bench import scratch_database
+
+
+def _checkout_worker(pk, orders, results):
+    """Decrement one unit of stock `orders` times, retrying on lock errors."""
+    sold = failed = retries = 0
+    for _ in range(orders):
+        while True:
+            try:
+                Products.objects.get(pk=pk).reduce_stock(1)
+                sold += 1
+                break
+            except ValueError:
+                failed += 1
+                break
+            except OperationalError:
+                retries += 1
+    connections.close_all()
+    results.put((sold, failed, retries))
+
+
+class Command(BaseCommand):
+    help = (
+        "Multi-process checkout throughput on a single SKU, with and without "
+        "sharded stock. Runs against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=200, help="Orders per process.")
+
+    def handle(self, *args, **options):
+        processes, orders = options["processes"], options["orders"]
+        total = processes * orders
+
+        with scratch_database():
+            for sharded in (False, True):
+                product = Products.objects.create(
+                    name="Bench SKU", image="products/bench.jpg",
+                    price=Decimal("1.00"), stock=total, sharded_stock=sharded,
+                )
+                if sharded:
+                    product.consolidate_stock()
+                connections.close_all()
+
+                ctx = multiprocessing.get_context("fork")
+                results = ctx.Queue()
+                workers = [
+                    ctx.Process(target=_checkout_worker, args=(product.pk, orders, results))
+                    for _ in range(processes)
+                ]
+                start = time.perf_counter()
+                for w in workers:
+                    w.start()
+                outcomes = [results.get() for _ in workers]
+                for w in workers:
+                    w.join()
+                elapsed = time.perf_counter() - start
+
+                sold = sum(o[0] for o in outcomes)
+                failed = sum(o[1] for o in outcomes)
+                retries = sum(o[2] for o in outcomes)
+                remaining = Products.objects.get(pk=product.pk).available_stock
+                label = "sharded" if sharded else "single row"
+                self.stdout.write(
+                    f"{label:>10}: {sold / elapsed:8.1f} checkouts/s  "
+                    f"sold={sold} failed={failed} lock_retries={retries} "
+                    f"remaining={remaining} (expected {total - sold})"
+                )
@@ -0,0 +1,166 @@
+import http.client
+import multiprocessing
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Products
+
+from ._bench import percentile
+
+
+def _flood(port, rate, stop, counts):
+    """One keystroke-happy client sending `rate` suggest requests a second."""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    ok = throttled = 0
+    keys = "abcdefghijklmnopqrstuvwxyz"
+    i = 0
+    started = next_at = time.perf_counter()
+    while not stop.is_set():
+        i += 1
+        next_at += 1.0 / rate
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            conn.request("GET", f"/search_suggest/?q={keys[i % 26]}")
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            continue
+        if response.status == 429:
+            throttled += 1
+        else:
+            ok += 1
+    counts.put((ok, throttled, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test: checkout page latency (a session with one product in the "
+        "cart, so each probe loads the session and the cart's products) while "
+        "typeahead clients flood /search_suggest/, with and without "
+        "ThrottleMiddleware. The app runs under gunicorn with gunicorn.conf.py "
+        "(prod profile, gthread workers), against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flooders", type=int, default=8)
+        parser.add_argument("--rate", type=float, default=40, help="Requests/s per flooder.")
+        parser.add_argument("--requests", type=int, default=200, help="Checkout probes per run.")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--port", type=int, default=8765)
+
+    def _start_gunicorn(self, port, throttled, options):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE="myproject.settings.prod",
+            DJANGO_SECRET_KEY=os.environ.get("DJANGO_SECRET_KEY") or secrets.token_urlsafe(50),
+            DJANGO_ALLOWED_HOSTS="127.0.0.1",
+            DJANGO_THROTTLE="1" if throttled else "0",
+            DJANGO_STATIC_PAGES="0",
+            GUNICORN_BIND=f"127.0.0.1:{port}",
+            WEB_CONCURRENCY=str(options["workers"]),
+            GUNICORN_THREADS=str(options["threads"]),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("gunicorn exited; run it by hand to see why.")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError("gunicorn did not start listening.")
+
+    def _cart_session(self, port, product_id):
+        """Session cookie for a cart holding one unit of `product_id`."""
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("GET", f"/cart/add/{product_id}/")
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        cookie = response.getheader("Set-Cookie", "")
+        if response.status != 200 or not cookie:
+            raise CommandError(f"Adding product {product_id} to a cart failed ({response.status}).")
+        return cookie.split(";", 1)[0]
+
+    def _probe_checkout(self, port, n, cookie):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            conn.request("GET", "/checkout/", headers={"Cookie": cookie})
+            response = conn.getresponse()
+            response.read()
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status != 200:
+                raise CommandError(f"Checkout page returned {response.status}.")
+        conn.close()
+        return samples
+
+    def handle(self, *args, **options):
+        port, flooders, n = options["port"], options["flooders"], options["requests"]
+        rate = options["rate"]
+        ctx = multiprocessing.get_context("fork")
+        product_id = Products.objects.order_by("pk").values_list("pk", flat=True).first()
+        if product_id is None:
+            raise CommandError("Needs at least one product to put in the cart.")
+
+        self.stdout.write(
+            f"gunicorn {options['workers']} workers x {options['threads']} threads; "
+            f"{flooders} typeahead clients at {rate:g} req/s each, "
+            f"{n} checkout page probes with a filled cart (ms)"
+        )
+        for label, throttled, flood in (
+            ("baseline", True, False),
+            ("flood, no throttle", False, True),
+            ("flood, throttled", True, True),
+        ):
+            server = self._start_gunicorn(port, throttled, options)
+            try:
+                cookie = self._cart_session(port, product_id)
+                self._probe_checkout(port, 5, cookie)  # warm-up
+                stop, counts = ctx.Event(), ctx.Queue()
+                workers = [
+                    ctx.Process(target=_flood, args=(port, rate, stop, counts))
+                    for _ in range(flooders if flood else 0)
+                ]
+                for w in workers:
+                    w.start()
+                time.sleep(0.5 if flood else 0)
+
+                samples = self._probe_checkout(port, n, cookie)
+
+                stop.set()
+                results = [counts.get() for _ in workers]
+                for w in workers:
+                    w.join()
+            finally:
+                server.terminate()
+                server.wait()
+
+            # Each flooder times its own run (which outlasts the probes)
+            served = sum(ok / duration for ok, _, duration in results)
+            rejected = sum(throttled / duration for _, throttled, duration in results)
+            self.stdout.write(
+                f"{label:>19}: checkout p50 {percentile(samples, 50):6.2f}  "
+                f"p95 {percentile(samples, 95):6.2f}  p99 {percentile(samples, 99):6.2f}  "
+                f"typeahead served {served:5.0f}/s  429s {rejected:5.0f}/s"
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myapp import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new OrderItems into the 'frequently bought together' matrix, "
+        "or rebuild it from scratch with --full."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild from all orders.")
+
+    def handle(self, *args, **options):
+        changed = recommendations.update(full=options["full"])
+        matrix = recommendations.get_matrix()
+        rows = len(matrix.row_ids) if matrix else 0
+        pairs = len(matrix.cols) if matrix else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Recommendations changed for {len(changed)} products; "
+            f"matrix has {rows} products, {pairs} related pairs."
+        ))
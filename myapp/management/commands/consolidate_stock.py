@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Products
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold stock shards back into Products.stock and spread them again. "
+        "Run periodically (e.g. every minute during a sale) for sharded products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, help="Only this product id.")
+        parser.add_argument(
+            "--enable", action="store_true", help="Flag the product as sharded first."
+        )
+        parser.add_argument(
+            "--disable", action="store_true",
+            help="Unflag the product and fold all shards back into stock.",
+        )
+
+    def handle(self, *args, **options):
+        if (options["enable"] or options["disable"]) and not options["product"]:
+            raise CommandError("--enable/--disable need --product.")
+
+        if options["product"]:
+            products = Products.objects.filter(pk=options["product"])
+            if not products.exists():
+                raise CommandError(f"Product {options['product']} does not exist.")
+            if options["enable"]:
+                products.update(sharded_stock=True)
+            elif options["disable"]:
+                products.update(sharded_stock=False)
+            if not options["disable"]:
+                products = products.filter(sharded_stock=True)
+        else:
+            products = Products.objects.filter(sharded_stock=True)
+
+        for product in products:
+            total = product.consolidate_stock()
+            self.stdout.write(f"{product.name} (#{product.pk}): {total} available")
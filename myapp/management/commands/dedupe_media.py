@@ -0,0 +1,91 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp import prerender
+from myapp.models import Products
+from myapp.storage import hash_file, sweep_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite media/ into content-addressed names: identical files are "
+        "merged, product images repointed, and unreferenced copies removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would change only."
+        )
+        parser.add_argument(
+            "--collect-orphans", action="store_true",
+            help="Also delete files no product references (outside the reuse grace period).",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        storage = Products._meta.get_field("image").storage
+        root = storage.location
+
+        # digest -> [relative names], walking the tree once
+        by_digest = defaultdict(list)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                name = os.path.relpath(full_path, root).replace(os.sep, "/")
+                by_digest[hash_file(full_path)].append(name)
+
+        renamed = removed = repointed = 0
+        freed = 0
+        for digest, names in sorted(by_digest.items()):
+            names.sort()
+            target = storage.hashed_name(names[0], digest)
+            # Keep one copy (the already-hashed one if present) as the blob.
+            keep = target if target in names else names[0]
+
+            if keep != target:
+                renamed += 1
+                if not dry_run:
+                    os.makedirs(os.path.dirname(storage.path(target)), exist_ok=True)
+                    os.replace(storage.path(keep), storage.path(target))
+
+            for name in names:
+                if name == target:
+                    continue
+                products = Products.objects.filter(image=name)
+                if dry_run:
+                    repointed += products.count()
+                else:
+                    with transaction.atomic():
+                        repointed += products.update(image=target)
+                if name != keep:
+                    removed += 1
+                    freed += os.path.getsize(storage.path(name))
+                    if not dry_run:
+                        storage.delete(name)
+                self.stdout.write(f"{name} -> {target}")
+
+        prefix = "Would rewrite" if dry_run else "Rewrote"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {renamed} files, removed {removed} duplicates "
+            f"({freed} bytes), repointed {repointed} products."
+        ))
+
+        # QuerySet.update() sends no post_save, so the signal that keeps the
+        # pre-rendered pages in sync never saw the new image names.
+        if repointed and not dry_run and getattr(settings, "STATIC_PAGES_ENABLED", False):
+            pages = prerender.render_all()
+            self.stdout.write(f"Re-rendered {pages} product pages.")
+
+        if options["collect_orphans"]:
+            orphans = sweep_orphans(dry_run=dry_run)
+            for name in orphans:
+                self.stdout.write(f"orphan: {name}")
+            prefix = "Would delete" if dry_run else "Deleted"
+            self.stdout.write(self.style.SUCCESS(f"{prefix} {len(orphans)} unreferenced files."))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp import maintenance
+from myapp.storage import sweep_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge expired sessions in small batches, recording abandoned carts "
+        "first, then release free SQLite pages and delete media files no "
+        "product references. Run from cron, or with --loop as a background "
+        "process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches.")
+        parser.add_argument(
+            "--pause", type=float, default=0.05, help="Seconds to sleep between batches."
+        )
+        parser.add_argument(
+            "--vacuum-pages", type=int, default=1000,
+            help="Free pages to release per run (0 for all).",
+        )
+        parser.add_argument(
+            "--enable-incremental-vacuum", action="store_true",
+            help="One-off: switch SQLite to auto_vacuum=INCREMENTAL (runs a full VACUUM).",
+        )
+        parser.add_argument(
+            "--skip-media", action="store_true", help="Don't sweep unreferenced media files."
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument("--interval", type=float, default=600, help="Seconds between runs.")
+
+    def handle(self, *args, **options):
+        if options["enable_incremental_vacuum"]:
+            if maintenance.enable_incremental_vacuum():
+                self.stdout.write("Switched to auto_vacuum=INCREMENTAL.")
+
+        while True:
+            self.run_once(options)
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def run_once(self, options):
+        stats = maintenance.purge_expired_sessions(
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            pause=options["pause"],
+        )
+        freed = maintenance.incremental_vacuum(options["vacuum_pages"] or None)
+        vacuum = (
+            "incremental vacuum not enabled" if freed is None else f"{freed} pages released"
+        )
+        self.stdout.write(
+            f"Removed {stats['sessions']} sessions ({stats['carts']} abandoned carts) "
+            f"in {stats['batches']} batches; write lock {stats['lock_seconds'] * 1000:.1f}ms "
+            f"total, {stats['max_lock_seconds'] * 1000:.1f}ms max; {vacuum}."
+        )
+        if not options["skip_media"]:
+            orphans = sweep_orphans()
+            self.stdout.write(f"Deleted {len(orphans)} unreferenced media files.")
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp import prerender
+
+
+class Command(BaseCommand):
+    help = "Rebuild every pre-rendered catalogue page under STATIC_PAGES_ROOT."
+
+    def handle(self, *args, **options):
+        count = prerender.render_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} product pages and 2 grid pages to {settings.STATIC_PAGES_ROOT}."
+        ))
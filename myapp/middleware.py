@@ -0,0 +1,208 @@
+"""
+Request middleware.
+
+ThrottleMiddleware: per-client throttling and load shedding for the chatty
+JSON endpoints. It looks up the resolved URL name in settings:
+
+    THROTTLE_RATES = {"search_suggest": (5, 10), ...}   # (per second, burst)
+                                                        # "name:POST" = that method only
+    THROTTLE_SHED = {"search_suggest": 2, ...}          # max busy threads
+
+Each client IP gets a token bucket per URL name. The session cookie is
+deliberately not used: a bot can send a fresh random one with every
+request. Behind a reverse proxy, set THROTTLE_CLIENT_IP_HEADER (e.g.
+"HTTP_X_REAL_IP") to the META key the proxy fills in.
+
+Buckets live in this process by default, so each gunicorn worker allows the
+full rate. THROTTLE_BACKEND = "cache" keeps them in the default Django cache
+instead, which only shares them if that cache is shared, e.g.:
+
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379",
+    }}
+
+The middleware refuses to start with "cache" on a local-memory or dummy
+cache (Django's default when CACHES isn't set).
+
+THROTTLE_SHED caps how many of this worker's threads may already be busy
+when one of those endpoints is admitted. It only bites with threaded
+workers (gunicorn.conf.py uses gthread): with N threads and a limit below
+N, a typeahead flood can never take the threads checkout needs.
+
+Rejected requests get a small JSON 429 with Retry-After.
+
+PrerenderedPagesMiddleware: serves pages written by myapp.prerender.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import FileResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+from .prerender import page_path
+
+
+class _GCRABuckets:
+    """
+    Token buckets stored as a single "theoretical arrival time" per key
+    (the generic cell rate algorithm), so a bucket is one float.
+    """
+
+    def take(self, key, rate, burst):
+        """Spend one token; returns 0 if allowed, else seconds to wait."""
+        interval = 1.0 / rate
+        now = self.now()
+        tat = max(self.get(key) or now, now) + interval
+        wait = tat - now - burst * interval
+        if wait > 0:
+            return wait
+        self.set(key, tat, burst * interval)
+        return 0
+
+
+class LocalBuckets(_GCRABuckets):
+    """In-process buckets; the least recently used keys are dropped past max_keys."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+
+    now = staticmethod(time.monotonic)
+
+    def take(self, key, rate, burst):
+        with self._lock:
+            return super().take(key, rate, burst)
+
+    def get(self, key):
+        return self._tats.get(key)
+
+    def set(self, key, tat, ttl):
+        self._tats[key] = tat
+        self._tats.move_to_end(key)
+        if len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+
+
+class CacheBuckets(_GCRABuckets):
+    """
+    Buckets in the default Django cache, shared by every worker using it.
+    The read-then-write isn't atomic, so racing requests may let one or two
+    extra through; fine for throttling.
+    """
+
+    # Per-process caches would silently give every worker its own buckets
+    UNSHARED_BACKENDS = (
+        "django.core.cache.backends.locmem.LocMemCache",
+        "django.core.cache.backends.dummy.DummyCache",
+    )
+
+    now = staticmethod(time.time)
+
+    def __init__(self):
+        backend = settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"]
+        if backend in self.UNSHARED_BACKENDS:
+            raise ImproperlyConfigured(
+                f'THROTTLE_BACKEND = "cache" needs a shared default cache '
+                f"(Redis, Memcached, database), not {backend}."
+            )
+
+    def get(self, key):
+        return cache.get(f"throttle:{key}")
+
+    def set(self, key, tat, ttl):
+        cache.set(f"throttle:{key}", tat, timeout=math.ceil(ttl) + 1)
+
+
+def client_key(request):
+    header = getattr(settings, "THROTTLE_CLIENT_IP_HEADER", None)
+    if header and request.META.get(header):
+        return f"ip:{request.META[header].split(',')[0].strip()}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def too_many_requests(wait):
+    response = JsonResponse({"error": "Too many requests"}, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(wait)))
+    # Don't pay for a django.request warning on every rejected request
+    response._has_been_logged = True
+    return response
+
+
+class ThrottleMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rates = getattr(settings, "THROTTLE_RATES", {})
+        self.shed = getattr(settings, "THROTTLE_SHED", {})
+        if getattr(settings, "THROTTLE_BACKEND", "local") == "cache":
+            self.buckets = CacheBuckets()
+        else:
+            self.buckets = LocalBuckets()
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        # Decide before the rest of the middleware stack runs, so a 429
+        # costs a URL resolve and a bucket update, nothing more.
+        rejected = self.check(request)
+        if rejected is not None:
+            return rejected
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def check(self, request):
+        try:
+            name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+
+        limit = self.shed.get(name)
+        if limit is not None and self.in_flight >= limit:
+            return too_many_requests(1)
+
+        rule = f"{name}:{request.method}"
+        rate = self.rates.get(rule)
+        if rate is None:
+            rule, rate = name, self.rates.get(name)
+        if rate is not None:
+            wait = self.buckets.take(f"{rule}:{client_key(request)}", *rate)
+            if wait:
+                return too_many_requests(wait)
+        return None
+
+
+class PrerenderedPagesMiddleware:
+    """
+    Answer plain GETs for pre-rendered pages from disk, skipping sessions,
+    the ORM and templates. Unused unless STATIC_PAGES_ENABLED. Middleware
+    below this one never sees these responses, so anything that sets
+    headers on every page (XFrameOptionsMiddleware) must come above it.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "STATIC_PAGES_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and not request.META.get("QUERY_STRING"):
+            path = page_path(request.path_info)
+            if path is not None:
+                try:
+                    return FileResponse(open(path, "rb"), content_type="text/html; charset=utf-8")
+                except FileNotFoundError:
+                    pass
+        return self.get_response(request)
+
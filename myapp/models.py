@@ -1,4 +1,8 @@
-from django.db import models
+import random
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -9,26 +13,132 @@ class Products(models.Model):
     image = models.ImageField(upload_to='products/')
     stock = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Hot SKUs (flash sales) spread their stock across StockShard rows so
+    # concurrent checkouts don't all queue on this row.
+    sharded_stock = models.BooleanField(default=False)
 
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    STOCK_SHARDS = 8
+
     class Meta:
         ordering = ['name']
 
     def __str__(self):
         return self.name
 
+    @property
+    def available_stock(self):
+        """Exact stock on hand, including units held in stock shards."""
+        if not self.sharded_stock:
+            return self.stock
+        return (
+            Products.objects.filter(pk=self.pk)
+            .annotate(sharded=Coalesce(Sum("stock_shards__quantity"), 0))
+            .values_list(F("stock") + F("sharded"), flat=True)
+            .get()
+        )
+
     def reduce_stock(self, quantity):
         """Safely reduce stock and prevent negative values."""
-        if quantity > self.stock:
+        if self.sharded_stock:
+            return self._reduce_sharded_stock(quantity)
+        # Conditional UPDATE, not read-modify-write: concurrent checkouts
+        # would otherwise overwrite each other's decrements and oversell.
+        if not self._take_from_reserve(quantity):
             raise ValueError("Not enough stock available")
-        self.stock -= quantity
-        self.save()
 
     def increase_stock(self, quantity):
-        self.stock += quantity
-        self.save()
+        # Restocks of sharded products land in the reserve; the next
+        # consolidation spreads them.
+        Products.objects.filter(pk=self.pk).update(
+            stock=F("stock") + quantity, updated_at=timezone.now()
+        )
+        self.refresh_from_db(fields=["stock", "updated_at"])
+
+    def _reduce_sharded_stock(self, quantity):
+        """
+        Take `quantity` from a random shard with a conditional UPDATE, so
+        concurrent checkouts touch different rows. Falls back to the reserve
+        (`stock`) and finally to a consolidation before giving up.
+        """
+        shards = list(range(self.STOCK_SHARDS))
+        random.shuffle(shards)
+        for shard in shards:
+            taken = StockShard.objects.filter(
+                product_id=self.pk, shard=shard, quantity__gte=quantity
+            ).update(quantity=F("quantity") - quantity)
+            if taken:
+                return
+
+        if self._take_from_reserve(quantity):
+            return
+
+        # Units are spread too thin for any single row: pool them and retry.
+        try:
+            with transaction.atomic():
+                self.consolidate_stock(redistribute=False)
+                if not self._take_from_reserve(quantity):
+                    raise ValueError("Not enough stock available")
+        except ValueError:
+            # The consolidation was rolled back; drop its in-memory total.
+            self.refresh_from_db(fields=["stock"])
+            raise
+        self.consolidate_stock()
+
+    def _take_from_reserve(self, quantity):
+        taken = Products.objects.filter(pk=self.pk, stock__gte=quantity).update(
+            stock=F("stock") - quantity, updated_at=timezone.now()
+        )
+        if taken:
+            self.refresh_from_db(fields=["stock", "updated_at"])
+        return bool(taken)
+
+    def consolidate_stock(self, redistribute=True):
+        """
+        Fold all shard quantities back into `stock`. With `redistribute`
+        (and the product still flagged) the total is spread evenly across
+        STOCK_SHARDS rows again, leaving any remainder in `stock`.
+        """
+        with transaction.atomic():
+            product = Products.objects.select_for_update().get(pk=self.pk)
+            shards = StockShard.objects.select_for_update().filter(product=product)
+            total = product.stock + sum(s.quantity for s in shards)
+
+            per_shard = 0
+            if redistribute and product.sharded_stock:
+                per_shard = total // self.STOCK_SHARDS
+
+            shards.delete()
+            if per_shard:
+                StockShard.objects.bulk_create(
+                    StockShard(product=product, shard=i, quantity=per_shard)
+                    for i in range(self.STOCK_SHARDS)
+                )
+
+            self.stock = total - per_shard * self.STOCK_SHARDS
+            Products.objects.filter(pk=self.pk).update(stock=self.stock)
+        return total
+
+
+class StockShard(models.Model):
+    """A slice of a hot product's stock; see Products.sharded_stock."""
+    product = models.ForeignKey(
+        Products,
+        on_delete=models.CASCADE,
+        related_name="stock_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "shard"], name="unique_stock_shard"),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} shard {self.shard}: {self.quantity}"
 
 
 class Order(models.Model):
@@ -51,6 +161,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # order history: newest-first per customer / per status
+            # -id matches the keyset order so no sort step is needed
+            models.Index(fields=['email', '-created_at', '-id'], name='order_email_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
@@ -96,3 +212,30 @@ class OrderItem(models.Model):
 
         # Update order total after saving
         self.order.update_total()
+
+
+class AbandonedCart(models.Model):
+    """
+    Daily totals of cart contents left in sessions that expired without
+    checking out; written by myapp.maintenance before the sessions go.
+    `day` is when the session was last saved, not when it expired.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(
+        Products,
+        on_delete=models.CASCADE,
+        related_name="abandoned_carts"
+    )
+
+    carts = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="unique_abandoned_cart_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.quantity} × {self.product.name}"
@@ -0,0 +1,136 @@
+"""
+Static pre-rendering of catalogue pages.
+
+With STATIC_PAGES_ENABLED, the home page, /product_list/ and every
+/product/<pk>/ are written as `index.html` files under STATIC_PAGES_ROOT:
+
+    prerendered/index.html
+    prerendered/product_list/index.html
+    prerendered/product/<pk>/index.html
+
+A front-end server can serve them directly (nginx:
+`try_files /prerendered$uri/index.html @django;`), and
+PrerenderedPagesMiddleware serves them from disk otherwise. Nothing in
+them is per-visitor: the cart badge is filled in by base.html's JS.
+
+Saving or deleting a product queues its page and those of the products
+that list it as related; a recommendations update queues the pages whose
+related products changed. A background thread renders just those pages
+plus the two grid pages. `prerender_pages` rebuilds all.
+"""
+import logging
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory
+
+from . import views
+from .models import Products
+
+logger = logging.getLogger(__name__)
+
+# URL path -> page directory, only for the pages we render
+_PAGE_URL = re.compile(r"^/(?:(product_list)/|product/(\d+)/)?$")
+
+
+def _root():
+    return Path(settings.STATIC_PAGES_ROOT)
+
+
+def page_path(url_path):
+    """File for a pre-rendered URL path, or None if it isn't one."""
+    match = _PAGE_URL.match(url_path)
+    if not match:
+        return None
+    if match.group(1):
+        return _root() / "product_list" / "index.html"
+    if match.group(2):
+        return _root() / "product" / match.group(2) / "index.html"
+    return _root() / "index.html"
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".page-", dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def render_grids():
+    factory = RequestFactory()
+    _write(page_path("/"), views.home(factory.get("/")).content)
+    _write(page_path("/product_list/"), views.product_list(factory.get("/product_list/")).content)
+
+
+def render_product(pk):
+    """(Re)write one product page, or remove it if the product is gone."""
+    url = f"/product/{pk}/"
+    if not Products.objects.filter(pk=pk).exists():
+        shutil.rmtree(page_path(url).parent, ignore_errors=True)
+        return False
+    response = views.product_detail(RequestFactory().get(url), pk=pk)
+    _write(page_path(url), response.content)
+    return True
+
+
+def render_all():
+    """Full rebuild; returns the number of product pages written."""
+    root = _root() / "product"
+    current = set(Products.objects.values_list("pk", flat=True))
+    if root.exists():
+        for stale in root.iterdir():
+            if not stale.name.isdigit() or int(stale.name) not in current:
+                shutil.rmtree(stale, ignore_errors=True)
+    for pk in current:
+        render_product(pk)
+    render_grids()
+    return len(current)
+
+
+# -------------------------------
+# Incremental regeneration queue
+# -------------------------------
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def schedule(*pks):
+    """Queue products `pks` (and the grids) for regeneration."""
+    global _worker
+    for pk in pks:
+        _queue.put(pk)
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain, name="prerender", daemon=True)
+            _worker.start()
+
+
+def _drain():
+    while True:
+        pks = {_queue.get()}
+        # Coalesce a burst of saves (e.g. a bulk edit) into one pass
+        while True:
+            try:
+                pks.add(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for pk in pks:
+                render_product(pk)
+            render_grids()
+        except Exception:
+            logger.exception("Pre-rendering %d product pages failed", len(pks))
+        finally:
+            connection.close()
+            for _ in pks:
+                _queue.task_done()
@@ -0,0 +1,232 @@
+"""
+"Frequently bought together" recommendations.
+
+Co-occurrence counts (how many orders contain both product A and B) are
+kept in a compact CSR file at settings.RECOMMENDATIONS_PATH:
+
+    header   magic, nrows, nnz, watermark (last OrderItem id folded in)
+    row_ids  uint32[nrows]     product ids with neighbours, ascending
+    indptr   uint32[nrows + 1] row offsets into cols/counts
+    cols     uint32[nnz]       neighbour ids, most frequent first
+    counts   uint32[nnz]
+
+Every worker memory-maps the file, so a lookup is a binary search plus a
+slice with no database work. `update()` folds in OrderItems newer than the
+watermark and atomically replaces the file; checkout triggers it through
+`schedule_update()` on a background thread, and `build_recommendations`
+does the same from cron. With STATIC_PAGES_ENABLED, the background thread
+also queues the pre-rendered pages whose related products may have moved.
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import OrderItem
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FBTOGTH1"
+HEADER = struct.Struct("<8sIIQ")
+
+
+class CooccurrenceMatrix:
+    """Read-only view over a memory-mapped recommendations file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, nrows, nnz, self.watermark = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recommendations file")
+        if len(self._mmap) != HEADER.size + 4 * (2 * nrows + 1 + 2 * nnz):
+            raise ValueError(f"{path} is truncated")
+
+        data = memoryview(self._mmap)[HEADER.size:].cast("I")
+        self.row_ids = data[:nrows]
+        self.indptr = data[nrows:2 * nrows + 1]
+        self.cols = data[2 * nrows + 1:2 * nrows + 1 + nnz]
+        self.counts = data[2 * nrows + 1 + nnz:2 * nrows + 1 + 2 * nnz]
+
+    def is_current(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return (st.st_ino, st.st_mtime_ns) == (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def related(self, product_id, k=4):
+        """Ids of the top-k products (all with k=None) bought with `product_id`."""
+        i = bisect_left(self.row_ids, product_id)
+        if i == len(self.row_ids) or self.row_ids[i] != product_id:
+            return []
+        start, end = self.indptr[i], self.indptr[i + 1]
+        if k is not None:
+            end = min(start + k, end)
+        return self.cols[start:end].tolist()
+
+    def to_dict(self):
+        """Expand to {product_id: {other_id: count}} for rebuilding."""
+        rows = {}
+        for i, pid in enumerate(self.row_ids):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            rows[pid] = dict(zip(self.cols[start:end], self.counts[start:end]))
+        return rows
+
+
+def _path():
+    return str(settings.RECOMMENDATIONS_PATH)
+
+
+_matrix = None
+
+
+def get_matrix():
+    """This process's mapped matrix, remapped when the file is replaced."""
+    global _matrix
+    path = _path()
+    if _matrix is None or not _matrix.is_current(path):
+        try:
+            _matrix = CooccurrenceMatrix(path)
+        except (OSError, ValueError, TypeError, struct.error):
+            # Missing, empty, truncated or foreign: behave as if there
+            # were no recommendations yet (the next update rebuilds it).
+            _matrix = None
+    return _matrix
+
+
+def related_products(product_id, k=4):
+    matrix = get_matrix()
+    return matrix.related(product_id, k) if matrix else []
+
+
+# -------------------------------
+# Building
+# -------------------------------
+def _count_pairs(rows, items):
+    """
+    Add co-occurrences for `items`: (order_id, item_id, product_id, is_new)
+    tuples sorted by order then item id. Each new item pairs with the
+    products that were already in its order, so every unordered pair is
+    counted once per order no matter how the items were batched. Returns
+    the ids whose rows changed.
+    """
+    changed = set()
+    current_order, seen = None, set()
+    for order_id, _, product_id, is_new in items:
+        if order_id != current_order:
+            current_order, seen = order_id, set()
+        if is_new and product_id not in seen:
+            for other in seen:
+                rows[product_id][other] += 1
+                rows[other][product_id] += 1
+                changed.update((product_id, other))
+        seen.add(product_id)
+    return changed
+
+
+def _write(path, rows, watermark):
+    row_ids = array("I", sorted(pid for pid, neighbours in rows.items() if neighbours))
+    indptr, cols, counts = array("I", [0]), array("I"), array("I")
+    for pid in row_ids:
+        ranked = sorted(rows[pid].items(), key=lambda kv: (-kv[1], kv[0]))
+        cols.extend(other for other, _ in ranked)
+        counts.extend(count for _, count in ranked)
+        indptr.append(len(cols))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".recommendations-", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(row_ids), len(cols), watermark))
+        for arr in (row_ids, indptr, cols, counts):
+            arr.tofile(f)
+    os.replace(tmp, path)
+
+
+def update(full=False):
+    """
+    Fold OrderItems newer than the file's watermark into the matrix (or
+    rebuild it from scratch with `full`). Returns the set of product ids
+    whose recommendations changed (every row, for a full rebuild).
+
+    Each file is a pure function of (previous file, items up to watermark),
+    so concurrent updates can't double count; the loser is simply redone.
+    """
+    path = _path()
+    matrix = None if full else get_matrix()
+    watermark = matrix.watermark if matrix else 0
+
+    new_items = OrderItem.objects.filter(id__gt=watermark)
+    latest = new_items.order_by("-id").values_list("id", flat=True).first()
+    if latest is None:
+        if full:
+            _write(path, {}, 0)
+        return set()
+
+    rows = defaultdict(lambda: defaultdict(int))
+    if matrix:
+        for pid, neighbours in matrix.to_dict().items():
+            rows[pid].update(neighbours)
+
+    items = (
+        OrderItem.objects
+        .filter(order_id__in=new_items.values("order_id"), id__lte=latest)
+        .order_by("order_id", "id")
+        .values_list("order_id", "id", "product_id")
+    )
+    changed = _count_pairs(rows, ((o, i, p, i > watermark) for o, i, p in items))
+    _write(path, rows, latest)
+    return changed
+
+
+# -------------------------------
+# Background updates
+# -------------------------------
+_pending = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def schedule_update():
+    """
+    Ask this process's background thread to run update(). Calls made
+    while an update is running coalesce into one more pass, so a burst of
+    checkouts costs one rewrite rather than one each.
+    """
+    global _worker
+    _pending.set()
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_update_loop, name="recommendations", daemon=True
+            )
+            _worker.start()
+
+
+def _update_loop():
+    while True:
+        _pending.wait()
+        _pending.clear()
+        try:
+            changed = update()
+            if changed and getattr(settings, "STATIC_PAGES_ENABLED", False):
+                # Imported here: prerender renders views, which import us
+                from . import prerender
+
+                prerender.schedule(*changed)
+        except Exception:
+            logger.exception("Updating recommendations failed")
+        finally:
+            connection.close()
+
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import prerender, recommendations
+from .models import Products
+from .storage import collect_orphan
+
+
+# -------------------------------
+# Media garbage collection
+# -------------------------------
+@receiver(post_init, sender=Products)
+def remember_loaded_image(sender, instance, **kwargs):
+    # Only a str came from the database; a File here is a new upload whose
+    # original name must never be collected.
+    image = instance.__dict__.get("image")
+    instance._loaded_image = image if isinstance(image, str) else None
+
+
+@receiver(post_save, sender=Products)
+def collect_replaced_image(sender, instance, **kwargs):
+    previous = instance._loaded_image
+    current = instance.image.name
+    if previous and previous != current:
+        collect_orphan(previous)
+    instance._loaded_image = current
+
+
+@receiver(post_delete, sender=Products)
+def collect_deleted_image(sender, instance, **kwargs):
+    collect_orphan(instance.image.name)
+
+
+# -------------------------------
+# Pre-rendered pages
+# -------------------------------
+# Stock isn't shown on any pre-rendered page, so checkouts don't queue work.
+STOCK_ONLY_FIELDS = {"stock", "updated_at"}
+
+
+@receiver(post_save, sender=Products)
+@receiver(post_delete, sender=Products)
+def regenerate_product_pages(sender, instance, update_fields=None, **kwargs):
+    if not getattr(settings, "STATIC_PAGES_ENABLED", False):
+        return
+    if update_fields and set(update_fields) <= STOCK_ONLY_FIELDS:
+        return
+    # Co-occurrence is symmetric: the products bought with this one are
+    # exactly the pages that may show it under "related products".
+    pks = [instance.pk, *recommendations.related_products(instance.pk, k=None)]
+    transaction.on_commit(lambda: prerender.schedule(*pks))
+
@@ -0,0 +1,205 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored as `<upload_to>/<h[:2]>/<sha256><ext>`, so saving the same
+image twice reuses one file instead of Django's `_A1hE17V` suffixed copies.
+A blob is referenced by every Products row whose `image` holds its name;
+`collect_orphan` removes it once that count drops to zero.
+
+Reusing a blob doesn't create a row until the uploading request commits,
+so a concurrent collection could see zero references and delete a file
+that is about to be used again. Each reuse touches the blob's mtime and
+collection skips anything touched within ORPHAN_GRACE_SECONDS. A skipped
+blob is checked again once its grace period is over; `sweep_orphans`
+(run by `gc_sessions` and `dedupe_media --collect-orphans`) catches any
+whose retry was lost to a restart.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+import time
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_GRACE_SECONDS = 10 * 60
+
+
+def hash_file(path, chunk_size=64 * 1024):
+    """sha256 hex digest of a file on disk, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream every upload straight to a temp file (no in-memory buffering)
+    and hash it on the way, so the storage doesn't have to re-read it.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the sha256 of their content."""
+
+    def hashed_name(self, name, digest):
+        name = name.replace("\\", "/")
+        dirname, basename = posixpath.split(name)
+        stem, ext = os.path.splitext(basename)
+        if stem == digest and posixpath.basename(dirname) == digest[:2]:
+            return name
+        return posixpath.join(dirname, digest[:2], digest + ext.lower())
+
+    def get_available_name(self, name, max_length=None):
+        # Identical content maps to the same name; never suffix.
+        return name
+
+    def _save(self, name, content):
+        digest = getattr(content, "content_hash", None)
+        source = None
+        if digest and hasattr(content, "temporary_file_path"):
+            source = content.temporary_file_path()
+        else:
+            digest, source = self._spool(content)
+            content = None
+
+        final = self.hashed_name(name, digest)
+        full_path = self.path(final)
+        if os.path.exists(full_path):
+            # Mark the blob as in use so collect_orphan leaves it alone
+            # until this upload's row is committed.
+            os.utime(full_path)
+            if content is None:
+                os.remove(source)
+            return final
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if content is None:
+            os.replace(source, full_path)
+        else:
+            # Same digest means same bytes, so losing a race is harmless.
+            file_move_safe(source, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return final
+
+    def _spool(self, content):
+        """Copy `content` into a temp file next to MEDIA_ROOT while hashing it."""
+        os.makedirs(self.location, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=".upload-", dir=self.location)
+        hasher = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return hasher.hexdigest(), path
+
+
+def grace_remaining(path):
+    """Seconds until the blob at `path` may be collected (0 if it may now)."""
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+    return max(0, ORPHAN_GRACE_SECONDS - age)
+
+
+def is_recently_used(path):
+    return grace_remaining(path) > 0
+
+
+def _image_storage():
+    from .models import Products
+
+    return Products._meta.get_field("image").storage
+
+
+def collect_orphan(name):
+    """Delete `name` from media storage once no product references it."""
+    if name:
+        transaction.on_commit(lambda: _collect(name))
+
+
+def _collect(name):
+    from .models import Products
+
+    if Products.objects.filter(image=name).exists():
+        return
+    storage = _image_storage()
+    if not storage.exists(name):
+        return
+    wait = grace_remaining(storage.path(name))
+    if wait:
+        _collect_later(name, wait + 1)
+    else:
+        storage.delete(name)
+
+
+def _collect_later(name, delay):
+    timer = threading.Timer(delay, _collect_in_background, args=(name,))
+    timer.daemon = True
+    timer.start()
+
+
+def _collect_in_background(name):
+    try:
+        _collect(name)
+    except Exception:
+        logger.exception("Collecting media file %s failed", name)
+    finally:
+        connection.close()
+
+
+def sweep_orphans(dry_run=False):
+    """
+    Delete every media file no product references, except those inside
+    their grace period (an upload may be about to commit a reference).
+    Returns the names deleted, or that would be with `dry_run`.
+    """
+    from .models import Products
+
+    storage = _image_storage()
+    root = storage.location
+    referenced = set(Products.objects.values_list("image", flat=True))
+    orphans = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.startswith("."):
+                continue
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            if name in referenced or is_recently_used(path):
+                continue
+            orphans.append(name)
+            if not dry_run:
+                storage.delete(name)
+    return orphans
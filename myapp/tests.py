@@ -1,3 +1,522 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import maintenance, prerender, recommendations, storage
+from .middleware import ThrottleMiddleware
+from .models import AbandonedCart, Order, OrderItem, Products, StockShard
+from .views import order_history_token, orders_page, orders_page_queryset
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Products.objects.create(
+            name="MC4 connector", image="products/mc4.jpg", price=Decimal("2.50"), stock=100
+        )
+        now = timezone.now()
+        for i in range(5):
+            for email, status in (("ada@example.com", "pending"), ("bob@example.com", "shipped")):
+                order = Order.objects.create(
+                    customer_name=email, email=email, phone="1", address="x",
+                    status=status, created_at=now - timedelta(days=i),
+                )
+                OrderItem.objects.create(
+                    order=order, product=cls.product, quantity=1, price=Decimal("2.50"),
+                    subtotal=Decimal("2.50"),
+                )
+
+    def explain(self, queryset):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plan assertions are written for SQLite")
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.explain(queryset)
+        self.assertIn(index, plan)
+        self.assertNotIn("SCAN myapp_order", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        return plan
+
+    def test_email_lookup_uses_index(self):
+        self.assertUsesIndex(
+            orders_page_queryset(Order.objects.filter(email="ada@example.com")),
+            "order_email_created_id_idx",
+        )
+
+    def test_status_lookup_uses_index(self):
+        self.assertUsesIndex(
+            orders_page_queryset(Order.objects.filter(status="pending")),
+            "order_status_created_id_idx",
+        )
+
+    def test_keyset_page_seeks_into_index(self):
+        orders = Order.objects.filter(email="ada@example.com")
+        _, cursor = orders_page(orders, page_size=2)
+        plan = self.assertUsesIndex(
+            orders_page_queryset(orders, cursor, page_size=2), "order_email_created_id_idx"
+        )
+        self.assertIn("created_at<", plan)
+
+    def test_keyset_pagination_walks_all_orders_newest_first(self):
+        orders = Order.objects.filter(email="ada@example.com")
+        seen, cursor = [], None
+        while True:
+            page, cursor = orders_page(orders, cursor, page_size=2)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(
+            [o.id for o in seen],
+            list(orders.order_by("-created_at", "-id").values_list("id", flat=True)),
+        )
+
+    def test_items_prefetched_in_one_query(self):
+        with self.assertNumQueries(2):
+            page, _ = orders_page(Order.objects.filter(email="ada@example.com"))
+            names = [item.product.name for order in page for item in order.items.all()]
+        self.assertEqual(len(names), 5)
+
+    def test_history_page_requires_valid_token(self):
+        url = reverse("order_history", args=[order_history_token("ada@example.com")])
+        response = self.client.get(url)
+        self.assertContains(response, "ada@example.com")
+        self.assertNotContains(response, "bob@example.com")
+
+        response = self.client.get(reverse("order_history", args=["forged"]))
+        self.assertRedirects(response, reverse("order_history_request"))
+
+    def test_history_link_requests_are_throttled(self):
+        url = reverse("order_history_request")
+        statuses = [
+            self.client.post(url, {"email": "ada@example.com"}).status_code for _ in range(7)
+        ]
+        self.assertEqual(statuses, [302] * 5 + [429] * 2)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_rotating_session_cookie_does_not_reset_throttle(self):
+        url = reverse("order_history_request")
+        statuses = []
+        for i in range(7):
+            self.client.cookies["sessionid"] = f"forged{i}"
+            statuses.append(self.client.post(url, {"email": "ada@example.com"}).status_code)
+        self.assertEqual(statuses, [302] * 5 + [429] * 2)
+
+    def test_admin_email_search(self):
+        from django.contrib.admin.sites import site
+
+        admin = site._registry[Order]
+        request = RequestFactory().get("/")
+        Order.objects.filter(email="bob@example.com").update(email="Bob@Example.com")
+
+        def search(term):
+            queryset, _ = admin.get_search_results(request, Order.objects.all(), term)
+            return set(queryset.values_list("email", flat=True))
+
+        self.assertEqual(search("ada@example.com"), {"ada@example.com"})
+        self.assertEqual(search("ada@"), {"ada@example.com"})
+        self.assertEqual(search("@example.com"), {"ada@example.com", "Bob@Example.com"})
+        self.assertEqual(search("bob@example.com"), {"Bob@Example.com"})
+
+
+class ShardedStockTests(TestCase):
+    def setUp(self):
+        self.product = Products.objects.create(
+            name="6mm solar cable", image="products/cable.jpg", price=Decimal("3.00"),
+            stock=83, sharded_stock=True,
+        )
+        # 8 shards of 10, 3 left in the reserve
+        self.product.consolidate_stock()
+
+    def shard_quantities(self):
+        return list(
+            StockShard.objects.filter(product=self.product)
+            .order_by("shard").values_list("quantity", flat=True)
+        )
+
+    def reserve(self):
+        return Products.objects.values_list("stock", flat=True).get(pk=self.product.pk)
+
+    def test_consolidate_spreads_stock_across_shards(self):
+        self.assertEqual(self.shard_quantities(), [10] * Products.STOCK_SHARDS)
+        self.assertEqual(self.reserve(), 3)
+        self.assertEqual(self.product.available_stock, 83)
+
+    def test_reduce_takes_from_one_shard(self):
+        self.product.reduce_stock(4)
+        quantities = self.shard_quantities()
+        self.assertEqual(sorted(quantities), [6] + [10] * (Products.STOCK_SHARDS - 1))
+        self.assertEqual(self.reserve(), 3)
+        self.assertEqual(self.product.available_stock, 79)
+
+    def test_reduce_falls_back_to_reserve(self):
+        StockShard.objects.filter(product=self.product).update(quantity=1)
+        Products.objects.filter(pk=self.product.pk).update(stock=5)
+        self.product.reduce_stock(3)
+        self.assertEqual(self.shard_quantities(), [1] * Products.STOCK_SHARDS)
+        self.assertEqual(self.reserve(), 2)
+        self.assertEqual(self.product.available_stock, 10)
+
+    def test_reduce_larger_than_any_shard_consolidates(self):
+        self.product.reduce_stock(50)
+        self.assertEqual(self.product.available_stock, 33)
+        # and the remainder is spread out again
+        self.assertEqual(self.shard_quantities(), [4] * Products.STOCK_SHARDS)
+        self.assertEqual(self.reserve(), 1)
+
+    def test_not_enough_stock_leaves_totals_unchanged(self):
+        before = (self.shard_quantities(), self.reserve())
+        with self.assertRaises(ValueError):
+            self.product.reduce_stock(84)
+        self.assertEqual((self.shard_quantities(), self.reserve()), before)
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(self.product.available_stock, 83)
+
+    def test_available_stock_after_consolidate(self):
+        self.product.reduce_stock(7)
+        self.product.increase_stock(5)
+        self.assertEqual(self.product.consolidate_stock(), 81)
+        self.assertEqual(self.product.available_stock, 81)
+        self.product.sharded_stock = False
+        self.product.save()
+        self.product.consolidate_stock()
+        self.assertFalse(StockShard.objects.filter(product=self.product).exists())
+        self.assertEqual(Products.objects.get(pk=self.product.pk).available_stock, 81)
+
+    def test_unsharded_reduce_keeps_concurrent_decrements(self):
+        product = Products.objects.create(
+            name="Fuse", image="products/fuse.jpg", price=Decimal("1.00"), stock=5
+        )
+        first, second = Products.objects.get(pk=product.pk), Products.objects.get(pk=product.pk)
+        first.reduce_stock(2)
+        second.reduce_stock(2)  # loaded before the first decrement
+        self.assertEqual(second.stock, 1)
+        with self.assertRaises(ValueError):
+            first.reduce_stock(2)
+        self.assertEqual(Products.objects.get(pk=product.pk).stock, 1)
+
+
+class MediaCollectionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_new_upload_never_collects_its_original_name(self):
+        bystander = os.path.join(self.media.name, "victim.jpg")
+        with open(bystander, "wb") as f:
+            f.write(b"unrelated")
+        with self.captureOnCommitCallbacks(execute=True):
+            Products.objects.create(
+                name="Breaker", price=Decimal("9.00"),
+                image=SimpleUploadedFile("victim.jpg", b"new image"),
+            )
+        self.assertTrue(os.path.exists(bystander))
+
+    def test_identical_uploads_share_one_file_until_unreferenced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Products.objects.create(
+                name="A", price=Decimal("1.00"), image=SimpleUploadedFile("a.jpg", b"same")
+            )
+            second = Products.objects.create(
+                name="B", price=Decimal("1.00"), image=SimpleUploadedFile("b.jpg", b"same")
+            )
+        self.assertEqual(first.image.name, second.image.name)
+        path = first.image.path
+        # Age the blob past the reuse grace period
+        os.utime(path, (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_image_replaced_within_grace_period_is_collected_later(self):
+        product = Products.objects.create(
+            name="A", price=Decimal("1.00"), image=SimpleUploadedFile("a.jpg", b"first")
+        )
+        old = product.image.name
+        product = Products.objects.get(pk=product.pk)
+        product.image = SimpleUploadedFile("a.jpg", b"second")
+        with mock.patch("myapp.storage._collect_later") as collect_later:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        self.assertEqual(collect_later.call_args.args[0], old)
+        self.assertTrue(default_storage.exists(old))
+
+        os.utime(default_storage.path(old), (0, 0))
+        storage._collect(old)
+        self.assertFalse(default_storage.exists(old))
+
+    def test_sweep_skips_referenced_and_recent_files(self):
+        referenced = Products.objects.create(
+            name="A", price=Decimal("1.00"), image=SimpleUploadedFile("a.jpg", b"kept")
+        ).image.name
+        aged = default_storage.save("products/old.jpg", ContentFile(b"old"))
+        recent = default_storage.save("products/new.jpg", ContentFile(b"new"))
+        for name in (referenced, aged):
+            os.utime(default_storage.path(name), (0, 0))
+
+        self.assertEqual(storage.sweep_orphans(dry_run=True), [aged])
+        self.assertTrue(default_storage.exists(aged))
+        self.assertEqual(storage.sweep_orphans(), [aged])
+        self.assertFalse(default_storage.exists(aged))
+        self.assertTrue(default_storage.exists(referenced))
+        self.assertTrue(default_storage.exists(recent))
+
+
+class RecommendationsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "recommendations.bin")
+        override = override_settings(RECOMMENDATIONS_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.products = [
+            Products.objects.create(
+                name=name, image=f"products/{name}.jpg", price=Decimal("1.00"), stock=100
+            )
+            for name in ("cable", "connector", "breaker")
+        ]
+
+    def order(self, *products):
+        order = Order.objects.create(customer_name="a", email="a@example.com", phone="1", address="x")
+        for product in products:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price=product.price, subtotal=product.price
+            )
+
+    def test_incremental_update_matches_full_rebuild(self):
+        cable, connector, breaker = self.products
+        self.order(cable, connector)
+        recommendations.update()
+        self.order(cable, connector, breaker)
+        self.order(cable, breaker)
+        self.order(breaker, cable)
+        recommendations.update()
+        incremental = recommendations.get_matrix().to_dict()
+
+        recommendations.update(full=True)
+        self.assertEqual(recommendations.get_matrix().to_dict(), incremental)
+        self.assertEqual(recommendations.related_products(cable.pk), [breaker.pk, connector.pk])
+
+    @override_settings(STATIC_PAGES_ENABLED=True)
+    def test_changed_products_have_their_pages_regenerated(self):
+        cable, connector, breaker = self.products
+        self.order(cable, connector)
+        self.assertEqual(recommendations.update(), {cable.pk, connector.pk})
+        self.order(cable, breaker)
+        self.assertEqual(recommendations.update(), {cable.pk, breaker.pk})
+
+        # Connector's page lists cable as related, so it is re-rendered too
+        with mock.patch("myapp.prerender.schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                Products.objects.filter(pk=cable.pk).get().save()
+        self.assertCountEqual(schedule.call_args.args, [cable.pk, connector.pk, breaker.pk])
+
+    def test_corrupt_file_is_treated_as_missing(self):
+        for content in (b"", b"not a matrix file at all", recommendations.MAGIC + b"\x05"):
+            with open(self.path, "wb") as f:
+                f.write(content)
+            self.assertEqual(recommendations.related_products(self.products[0].pk), [])
+            response = self.client.get(reverse("product_detail", args=[self.products[0].pk]))
+            self.assertEqual(response.status_code, 200)
+
+
+class ProductApiTests(TestCase):
+    def setUp(self):
+        self.hot = Products.objects.create(
+            name="Hot SKU", image="products/hot.jpg", price=Decimal("5.00"),
+            stock=16, sharded_stock=True,
+        )
+        self.hot.consolidate_stock()  # all 16 units now live in shards
+        self.empty = Products.objects.create(
+            name="Sold out", image="products/out.jpg", price=Decimal("5.00"), stock=0
+        )
+        self.url = reverse("api_products")
+
+    def results(self, **params):
+        return self.client.get(self.url, params).json()["results"]
+
+    def test_stock_is_available_stock_for_sharded_products(self):
+        self.assertEqual(
+            self.results(fields="id,stock", in_stock="1"), [{"id": self.hot.pk, "stock": 16}]
+        )
+        self.hot.reduce_stock(3)
+        self.assertEqual(self.results(ids=self.hot.pk, fields="stock"), [{"stock": 13}])
+
+    def test_etag_changes_when_shards_change(self):
+        params = {"ids": self.hot.pk, "fields": "id,stock"}
+        etag = self.client.get(self.url, params)["ETag"]
+        self.assertEqual(
+            self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.hot.reduce_stock(1)
+        self.assertEqual(
+            self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_non_finite_prices_are_rejected(self):
+        for value in ("nan", "inf", "-Infinity", "abc"):
+            self.assertEqual(self.client.get(self.url, {"min_price": value}).status_code, 400)
+
+    def test_out_of_range_ids_and_empty_fields_are_rejected(self):
+        for params in (
+            {"ids": "99999999999999999999"},
+            {"ids": "1,-99999999999999999999"},
+            {"cursor": "99999999999999999999"},
+            {"fields": ","},
+        ):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class PrerenderedPagesTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        override = override_settings(STATIC_PAGES_ENABLED=True, STATIC_PAGES_ROOT=self.dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.product = Products.objects.create(
+            name="Inverter", image="products/inverter.jpg", price=Decimal("99.00"), stock=3
+        )
+        self.url = f"/product/{self.product.pk}/"
+
+    def test_page_is_served_from_disk_with_frame_header(self):
+        prerender.render_product(self.product.pk)
+        path = prerender.page_path(self.url)
+        self.assertIn(b"Inverter", path.read_bytes())
+        path.write_bytes(b"from disk")
+
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), b"from disk")
+        self.assertEqual(response["X-Frame-Options"], "DENY")
+
+    def test_deleted_product_page_is_removed(self):
+        prerender.render_product(self.product.pk)
+        path = prerender.page_path(self.url)
+        self.assertTrue(path.exists())
+        pk = self.product.pk
+        self.product.delete()
+        self.assertFalse(prerender.render_product(pk))
+        self.assertFalse(path.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ThrottleTests(TestCase):
+    def test_search_suggest_rate_limited_with_retry_after(self):
+        url = reverse("search_suggest")
+        responses = [self.client.get(url, {"q": "c"}) for _ in range(12)]
+        self.assertEqual([r.status_code for r in responses], [200] * 10 + [429] * 2)
+        self.assertGreaterEqual(int(responses[-1]["Retry-After"]), 1)
+
+    @override_settings(THROTTLE_SHED={"search_suggest": 1})
+    def test_endpoints_shed_while_threads_are_busy(self):
+        factory = RequestFactory()
+        inner = []
+
+        def view(request):
+            if request.path == "/checkout/":
+                # a typeahead request arrives while checkout is running
+                inner.append(middleware(factory.get("/search_suggest/")).status_code)
+            return HttpResponse()
+
+        middleware = ThrottleMiddleware(view)
+        self.assertEqual(middleware(factory.get("/checkout/")).status_code, 200)
+        self.assertEqual(inner, [429])
+        self.assertEqual(middleware.in_flight, 0)
+        self.assertEqual(middleware(factory.get("/search_suggest/")).status_code, 200)
+
+    @override_settings(THROTTLE_BACKEND="cache")
+    def test_cache_backend_refuses_local_memory_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ThrottleMiddleware(HttpResponse)
+
+
+class SessionCleanupTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = Products.objects.create(
+            name="MC4 connector", image="products/mc4.jpg", price=Decimal("2.50"), stock=10
+        )
+        self.keys = 0
+
+    def session(self, cart=None, expires_in=timedelta(days=-1), data=None):
+        self.keys += 1
+        if data is None:
+            data = SessionStore().encode({"cart": cart} if cart else {})
+        return Session.objects.create(
+            session_key=f"session{self.keys}", session_data=data,
+            expire_date=self.now + expires_in,
+        )
+
+    def cart(self, quantity, pid=None):
+        return {str(pid or self.product.pk): {"price": "2.50", "quantity": quantity}}
+
+    def test_expired_sessions_purged_in_batches(self):
+        for _ in range(5):
+            self.session()
+        live = self.session(expires_in=timedelta(days=1))
+        stats = maintenance.purge_expired_sessions(batch_size=2, pause=0, now=self.now)
+        self.assertEqual((stats["sessions"], stats["batches"]), (5, 3))
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), [live.pk])
+
+    def test_max_batches_leaves_the_rest_for_the_next_run(self):
+        for _ in range(5):
+            self.session()
+        stats = maintenance.purge_expired_sessions(
+            batch_size=2, max_batches=1, pause=0, now=self.now
+        )
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(Session.objects.count(), 3)
+
+    def test_abandoned_carts_are_added_to_the_day_they_were_left(self):
+        expired = self.session(self.cart(2)).expire_date
+        self.session(self.cart(1))
+        day = (expired - timedelta(seconds=settings.SESSION_COOKIE_AGE)).date()
+        AbandonedCart.objects.create(
+            day=day, product=self.product, carts=1, quantity=4, value=Decimal("10.00")
+        )
+
+        stats = maintenance.purge_expired_sessions(pause=0, now=self.now)
+        self.assertEqual(stats["carts"], 2)
+        row = AbandonedCart.objects.get()
+        self.assertEqual(row.day, day)
+        self.assertEqual((row.carts, row.quantity, row.value), (3, 7, Decimal("17.50")))
+
+    def test_deleted_products_and_undecodable_sessions_are_skipped(self):
+        self.session(self.cart(1, pid=999999))
+        self.session(data="not a session")
+        self.session({"x": "not an item", str(self.product.pk): {"quantity": "many"}})
+        self.session({str(self.product.pk): "not an item"})
+        stats = maintenance.purge_expired_sessions(pause=0, now=self.now)
+        self.assertEqual((stats["sessions"], stats["carts"]), (4, 0))
+        self.assertFalse(AbandonedCart.objects.exists())
+
+    def test_vacuum_is_skipped_unless_sqlite_incremental(self):
+        if connection.vendor == "sqlite":
+            # the test database is in the default auto_vacuum=NONE mode
+            self.assertIsNone(maintenance.incremental_vacuum())
+        with mock.patch("myapp.maintenance.connection", vendor="postgresql"):
+            self.assertIsNone(maintenance.incremental_vacuum())
+            self.assertFalse(maintenance.enable_incremental_vacuum())
@@ -11,6 +11,7 @@ urlpatterns = [
     path('product/<int:pk>/edit/', views.edit_product, name='edit_product'),
     path('product/<int:pk>/delete/', views.delete_product, name='delete_product'),
     path("search_suggest/", views.search_suggest, name="search_suggest"),
+    path("api/products/", views.api_products, name="api_products"),
     path("cart/add/<int:pk>/", views.cart_add, name="cart_add"),
     path("cart/reduce/<int:pk>/", views.cart_reduce, name="cart_reduce"),
     path("cart/remove/<int:pk>/", views.cart_remove, name="cart_remove"),
@@ -19,5 +20,7 @@ urlpatterns = [
      path("checkout/", views.checkout, name="checkout"),
     path("checkout/success/", views.checkout_success, name="checkout_success"),
     path("checkout/empty/", views.checkout_empty, name="checkout_empty"),
+    path("orders/", views.order_history_request, name="order_history_request"),
+    path("orders/<str:token>/", views.order_history, name="order_history"),
     
 ]
\ No newline at end of file
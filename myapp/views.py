@@ -1,13 +1,29 @@
+import hashlib
+import json
+from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+from django.core.files.storage import default_storage
+from django.core import signing
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 
-from .models import Products, Order, OrderItem
+from .models import Products, Order, OrderItem, StockShard
 from .forms import ProductForm
+from . import recommendations
+
+try:
+    import orjson
+except ImportError:  # optional: plain json works, just slower
+    orjson = None
 
 
 # -------------------------------
@@ -56,7 +72,11 @@ def product_list(request):
 
 def product_detail(request, pk):
     product = get_object_or_404(Products, pk=pk)
-    return render(request, "product_detail.html", {"product": product})
+    # Top-K ids come from the memory-mapped co-occurrence matrix
+    related_ids = recommendations.related_products(product.pk, k=4)
+    related_lookup = Products.objects.in_bulk(related_ids)
+    related = [related_lookup[i] for i in related_ids if i in related_lookup]
+    return render(request, "product_detail.html", {"product": product, "related": related})
 
 
 def edit_product(request, pk):
@@ -98,6 +118,142 @@ def search_suggest(request):
     return JsonResponse(results, safe=False)
 
 
+# -------------------------------
+# Product API (JSON)
+# -------------------------------
+API_FIELDS = ("id", "name", "price", "image", "stock", "updated_at")
+API_DEFAULT_FIELDS = ("id", "name", "price", "image")
+API_MAX_IDS = 100
+API_MAX_LIMIT = 200
+
+
+def _dump_json(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _api_error(message):
+    return JsonResponse({"error": message}, status=400)
+
+
+def _api_price(value):
+    price = _to_decimal(value)
+    if not price.is_finite():
+        raise ValueError(f"{value!r} is not a price")
+    return price
+
+
+def _api_id(value):
+    # Larger values overflow the database's 64-bit integer columns
+    number = int(value)
+    if not 0 <= number < 2 ** 63:
+        raise ValueError(f"{value!r} is not an id")
+    return number
+
+
+def _with_available_stock(products):
+    """Annotate `available`: the reserve plus any stock shards."""
+    shard_total = (
+        StockShard.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return products.annotate(
+        available=F("stock") + Coalesce(Subquery(shard_total), 0)
+    )
+
+
+def api_products(request):
+    """
+    Read-only product lookup for cart/grid widgets.
+
+    ?ids=1,2,3        batch lookup (up to API_MAX_IDS)
+    ?q=cable          name filter; also min_price, max_price, in_stock=1
+    ?fields=id,name   only these fields (from API_FIELDS)
+    ?cursor=42&limit=50   keyset pagination on id; follow "next_cursor"
+
+    Rows come straight from .values(), never as model instances, and the
+    response carries an ETag derived from the ids, updated_at stamps and
+    (when returned) available stock, which shard decrements change without
+    touching updated_at.
+    """
+    params = request.GET
+    fields = params.get("fields")
+    fields = tuple(f for f in fields.split(",") if f) if fields else API_DEFAULT_FIELDS
+    if not fields:
+        return _api_error("No fields requested")
+    unknown = set(fields) - set(API_FIELDS)
+    if unknown:
+        return _api_error(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    products = Products.objects.order_by("id")
+    want_stock = "stock" in fields or params.get("in_stock") == "1"
+    if want_stock:
+        products = _with_available_stock(products)
+    try:
+        if params.get("ids"):
+            ids = [_api_id(i) for i in params["ids"].split(",") if i]
+            if len(ids) > API_MAX_IDS:
+                return _api_error(f"At most {API_MAX_IDS} ids per request")
+            products = products.filter(id__in=ids)
+            limit = API_MAX_IDS
+        else:
+            limit = max(1, min(int(params.get("limit", 50)), API_MAX_LIMIT))
+        if params.get("cursor"):
+            products = products.filter(id__gt=_api_id(params["cursor"]))
+        if params.get("min_price"):
+            products = products.filter(price__gte=_api_price(params["min_price"]))
+        if params.get("max_price"):
+            products = products.filter(price__lte=_api_price(params["max_price"]))
+    except (ValueError, ArithmeticError, ValidationError):
+        return _api_error("Malformed query parameter")
+    if params.get("q"):
+        products = products.filter(name__icontains=params["q"])
+    if params.get("in_stock") == "1":
+        products = products.filter(available__gt=0)
+
+    # Always fetch the stamps the ETag needs, even if not returned.
+    columns = (set(fields) - {"stock"}) | {"id", "updated_at"}
+    if want_stock:
+        columns.add("available")
+    rows = list(products.values(*columns)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    stamp = hashlib.md5(request.get_full_path().encode())
+    for row in rows:
+        stamp.update(f"{row['id']}:{row['updated_at'].timestamp()}:{row.get('available')};".encode())
+    etag = f'"{stamp.hexdigest()}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    results = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = row["available"] if field == "stock" else row[field]
+            if field == "price":
+                value = float(_round_money(value))
+            elif field == "image":
+                value = default_storage.url(value) if value else ""
+            elif field == "updated_at":
+                value = value.isoformat()
+            item[field] = value
+        results.append(item)
+
+    body = _dump_json({
+        "results": results,
+        "next_cursor": rows[-1]["id"] if has_more else None,
+    })
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
 # -------------------------------
 # CART UTILITIES
 # -------------------------------
@@ -315,9 +471,15 @@ def checkout(request):
 
             # Send confirmation email (fail silently so it doesn't block)
             try:
+                history_url = request.build_absolute_uri(
+                    reverse("order_history", args=[order_history_token(order.email)])
+                )
                 send_mail(
                     subject=f"Order #{order.id} Confirmation",
-                    message=f"Thanks {order.customer_name}, your order #{order.id} has been placed.",
+                    message=(
+                        f"Thanks {order.customer_name}, your order #{order.id} has been placed.\n\n"
+                        f"View your orders: {history_url}"
+                    ),
                     from_email=settings.DEFAULT_FROM_EMAIL,
                     recipient_list=[order.email],
                     fail_silently=True,
@@ -326,6 +488,10 @@ def checkout(request):
                 # Intentionally ignore email errors
                 pass
 
+            # Fold the new items into "frequently bought together" off the
+            # request path
+            transaction.on_commit(recommendations.schedule_update)
+
             # Clear cart
             request.session["cart"] = {}
             request.session.modified = True
@@ -362,3 +528,97 @@ def checkout_success(request):
 
 def checkout_empty(request):
     return render(request, "checkout_empty.html")
+
+
+# -------------------------------
+# ORDER HISTORY
+# -------------------------------
+ORDER_HISTORY_SALT = "myapp.order_history"
+ORDER_HISTORY_MAX_AGE = 60 * 60 * 24 * 7  # links are valid for a week
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
+def order_history_token(email):
+    return signing.dumps(email, salt=ORDER_HISTORY_SALT)
+
+
+def orders_page_queryset(orders, cursor=None, page_size=ORDER_HISTORY_PAGE_SIZE):
+    """
+    The query behind orders_page: newest-first on (created_at, id), which
+    is exactly the (email|status, -created_at, -id) index order. The
+    `created_at <= X` bound lets SQLite seek into the index; the OR then
+    only trims ties on X.
+    """
+    orders = orders.order_by("-created_at", "-id")
+    if cursor:
+        created, _, last_id = cursor.rpartition("|")
+        created, last_id = datetime.fromisoformat(created), int(last_id)
+        orders = orders.filter(created_at__lte=created).filter(
+            Q(created_at__lt=created) | Q(created_at=created, id__lt=last_id)
+        )
+    return orders[:page_size + 1]
+
+
+def orders_page(orders, cursor=None, page_size=ORDER_HISTORY_PAGE_SIZE):
+    """
+    One newest-first keyset page of `orders`, with items (and their
+    products) prefetched in a single extra query.
+
+    `cursor` is the "<created_at iso>|<id>" of the last order already
+    shown. Returns (orders, next_cursor or None).
+    """
+    page = list(
+        orders_page_queryset(orders, cursor, page_size).prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+        )
+    )
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    last = page[-1]
+    return page, f"{last.created_at.isoformat()}|{last.id}"
+
+
+def order_history_request(request):
+    """
+    Customers enter their email and get a signed link to their orders,
+    so nobody can browse someone else's history by guessing an address.
+    """
+    if request.method == "POST":
+        email = request.POST.get("email", "").strip()
+        if email and Order.objects.filter(email=email).exists():
+            url = request.build_absolute_uri(
+                reverse("order_history", args=[order_history_token(email)])
+            )
+            send_mail(
+                subject="Your orders",
+                message=f"View your orders: {url}",
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[email],
+                fail_silently=True,
+            )
+        # Same answer either way so addresses can't be probed.
+        messages.success(request, "If we have orders for that email, we've sent you a link.")
+        return redirect("order_history_request")
+    return render(request, "order_history_request.html")
+
+
+def order_history(request, token):
+    try:
+        email = signing.loads(token, salt=ORDER_HISTORY_SALT, max_age=ORDER_HISTORY_MAX_AGE)
+    except signing.BadSignature:
+        messages.error(request, "That link is invalid or has expired.")
+        return redirect("order_history_request")
+
+    try:
+        orders, next_cursor = orders_page(
+            Order.objects.filter(email=email), request.GET.get("cursor")
+        )
+    except ValueError:
+        return redirect("order_history", token=token)
+
+    return render(request, "order_history.html", {
+        "email": email,
+        "orders": orders,
+        "next_cursor": next_cursor,
+    })
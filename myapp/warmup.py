@@ -0,0 +1,52 @@
+"""
+Pay first-request costs before a worker takes traffic.
+
+`warm_up()` is called from gunicorn's post_fork hook (see gunicorn.conf.py):
+it resolves the URLconf, compiles every template into the cached loader,
+opens the database connection, maps the recommendations file and runs the
+catalogue/search views once so their queries and pages are hot.
+"""
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.db import connection
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.urls import get_resolver
+
+from . import recommendations, views
+from .models import Products
+
+
+def _templates():
+    root = Path(apps.get_app_config("myapp").path) / "templates"
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*.html"))
+
+
+def _render_views():
+    factory = RequestFactory()
+    views.home(factory.get("/"))
+    views.product_list(factory.get("/product_list/"))
+    views.search_suggest(factory.get("/search_suggest/", {"q": "a"}))
+    views.api_products(factory.get("/api/products/"))
+    first = Products.objects.order_by("id").values_list("id", flat=True).first()
+    if first is not None:
+        views.product_detail(factory.get(f"/product/{first}/"), pk=first)
+
+
+def warm_up():
+    """Run each warm-up step; returns {step: seconds}."""
+    steps = [
+        ("urls", lambda: get_resolver().url_patterns),
+        ("templates", lambda: [get_template(name) for name in _templates()]),
+        ("database", connection.ensure_connection),
+        ("recommendations", recommendations.get_matrix),
+        ("views", _render_views),
+    ]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    return timings
@@ -1,6 +1,9 @@
 """
 Django settings for myproject project.
 
+Shared by the dev and prod profiles in this package; point
+DJANGO_SETTINGS_MODULE at myproject.settings.dev or myproject.settings.prod.
+
 Generated by 'django-admin startproject' using Django 5.2.8.
 
 For more information on this file, see
@@ -13,7 +16,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 
 # Quick-start development settings - unsuitable for production
@@ -47,12 +50,16 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Above the early-returning middleware below, so throttled and
+    # pre-rendered responses still get X-Frame-Options
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myapp.middleware.ThrottleMiddleware',
+    'myapp.middleware.PrerenderedPagesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
@@ -126,6 +133,43 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Product images are stored by content hash so duplicate uploads share a file.
+STORAGES = {
+    "default": {"BACKEND": "myapp.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+FILE_UPLOAD_HANDLERS = ["myapp.storage.HashingFileUploadHandler"]
+
+# Per-client limits by URL name: (requests per second, burst).
+# See myapp.middleware; "cache" shares the buckets between workers, but
+# only with a shared CACHES["default"] (Redis, Memcached, database).
+THROTTLE_BACKEND = "local"
+THROTTLE_RATES = {
+    "search_suggest": (5, 10),
+    "api_products": (10, 30),
+    "cart_add": (5, 20),
+    "cart_reduce": (5, 20),
+    "cart_remove": (5, 20),
+    "cart_count": (5, 20),
+    # each POST mails a link to the address; a few per hour is plenty
+    "order_history_request:POST": (1 / 600, 5),
+}
+# Shed these when this many of the worker's threads are already busy
+# (keep below gunicorn's `threads` so checkout always has one free)
+THROTTLE_SHED = {
+    "search_suggest": 2,
+    "api_products": 3,
+}
+# META key holding the client IP when behind a proxy (e.g. "HTTP_X_REAL_IP")
+THROTTLE_CLIENT_IP_HEADER = None
+
+# Pre-rendered catalogue pages (see myapp.prerender)
+STATIC_PAGES_ENABLED = False
+STATIC_PAGES_ROOT = BASE_DIR / 'prerendered'
+
+# Memory-mapped "frequently bought together" matrix (see myapp.recommendations)
+RECOMMENDATIONS_PATH = BASE_DIR / 'var' / 'recommendations.bin'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,4 @@
+"""Local development: DEBUG on, media served by Django."""
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
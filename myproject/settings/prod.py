@@ -0,0 +1,61 @@
+"""
+Production profile, used by gunicorn.conf.py.
+
+Templates go through the cached loader explicitly so each worker compiles
+them once (the post-fork warm-up does that before the first request), and
+static files are served by WhiteNoise.
+
+DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS must be set: the key signs the
+order-history links, so the one committed in base.py must never be used.
+DJANGO_THROTTLE=0 turns ThrottleMiddleware off (bench_throttle uses it).
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import MIDDLEWARE, STORAGES, TEMPLATES
+
+DEBUG = False
+
+
+def _required_env(name):
+    value = os.environ.get(name)
+    if not value:
+        raise ImproperlyConfigured(f"Set the {name} environment variable.")
+    return value
+
+
+SECRET_KEY = _required_env("DJANGO_SECRET_KEY")
+ALLOWED_HOSTS = _required_env("DJANGO_ALLOWED_HOSTS").split(",")
+
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]["APP_DIRS"] = False
+TEMPLATES[0]["OPTIONS"]["loaders"] = [
+    (
+        "django.template.loaders.cached.Loader",
+        [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    ),
+]
+
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE.insert(
+    MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1,
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+)
+if os.environ.get("DJANGO_THROTTLE", "1") != "1":
+    MIDDLEWARE.remove("myapp.middleware.ThrottleMiddleware")
+STORAGES = {
+    **STORAGES,
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Without a front-end server in front of gunicorn, let Django serve media/.
+SERVE_MEDIA = os.environ.get("DJANGO_SERVE_MEDIA", "1") == "1"
+
+# Serve catalogue pages pre-rendered; run `manage.py prerender_pages` on deploy.
+STATIC_PAGES_ENABLED = os.environ.get("DJANGO_STATIC_PAGES", "1") == "1"